@@ -1,26 +1,98 @@
+import sys
 from copy import copy
-from dataclasses import dataclass
 from functools import lru_cache
-from html import escape
-from itertools import chain
+from html import escape as _html_escape
 from textwrap import indent
 from types import MappingProxyType
 from typing import (
-    Any, Dict, Iterable, Iterator, List, Mapping, MutableMapping, MutableSet,
-    Optional, Tuple, Type, Union,
+    AbstractSet, Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set,
+    Tuple, Type, TypeVar, Union,
 )
 
 
+ESCAPE_CACHE_SIZE = 4096
+# longer strings are mostly unique values (urls, inline data), caching them
+# would only keep them in memory after the render
+ESCAPE_CACHE_MAX_LENGTH = 64
+
+_ESCAPE_CACHE: Dict[str, str] = {}
+_ESCAPE_CACHE_NO_QUOTE: Dict[str, str] = {}
+
+
+def escape(s: str, quote: bool = True) -> str:
+    """ Cached version of html.escape for short repeated strings """
+    if len(s) > ESCAPE_CACHE_MAX_LENGTH:
+        return _html_escape(s, quote)
+    cache = _ESCAPE_CACHE if quote else _ESCAPE_CACHE_NO_QUOTE
+    result = cache.get(s)
+    if result is not None:
+        return result
+    result = _html_escape(s, quote)
+    if len(cache) >= ESCAPE_CACHE_SIZE:
+        cache.clear()
+    cache[s] = result
+    return result
+
+
 class Style(Dict[str, Any]):
+    __slots__ = ("_cache",)
+
     def __init__(self, *args: Any, **kwargs: Any):
         kwargs = {key.replace("_", "-"): value for key, value in kwargs.items()}
         super().__init__(*args, **kwargs)
+        self._cache: Optional[str] = None
 
     def __str__(self) -> str:
-        return " ".join(f"{key}: {value};" for key, value in sorted(self.items()))
+        if self._cache is not None:
+            return self._cache
+        if not self:
+            result = ""
+        else:
+            result = "; ".join(
+                f"{key}: {value}" for key, value in sorted(self.items())
+            ) + ";"
+        self._cache = result
+        return result
+
+    # every mutating dict method has to drop the cached string
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._cache = None
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self._cache = None
+        super().__delitem__(key)
+
+    if sys.version_info >= (3, 9):
+        def __ior__(self, other: Any) -> "Style":  # type: ignore[override,misc]
+            self._cache = None
+            return super().__ior__(other)
+
+    def clear(self) -> None:
+        self._cache = None
+        super().clear()
+
+    def pop(self, *args: Any) -> Any:
+        self._cache = None
+        return super().pop(*args)
+
+    def popitem(self) -> Tuple[str, Any]:
+        self._cache = None
+        return super().popitem()
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        self._cache = None
+        return super().setdefault(key, default)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self._cache = None
+        super().update(*args, **kwargs)
 
 
 class StyleSheet(Dict[Union[str, Tuple[str, ...]], Style]):
+    __slots__ = ()
+
     def __str__(self) -> str:
         styles = []
         for key, value in sorted(self.items(), key=str):
@@ -30,148 +102,404 @@ class StyleSheet(Dict[Union[str, Tuple[str, ...]], Style]):
         return "\n".join(styles)
 
 
-@dataclass(frozen=False)
+AttributeValue = Union[str, None, Style]
+
+
+class _ClassSet(Set[str]):
+    """ Set of tag classes which caches its formatted ``class`` attribute """
+
+    __slots__ = ("_formatted",)
+
+    def __init__(self, items: Iterable[str] = ()):
+        super().__init__(items)
+        self._formatted: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return repr(set(self))
+
+    def __copy__(self) -> "_ClassSet":
+        return self.__class__(self)
+
+    # every mutating set method has to drop the cached string
+
+    def add(self, value: str) -> None:
+        self._formatted = None
+        super().add(value)
+
+    def discard(self, value: object) -> None:
+        self._formatted = None
+        super().discard(value)
+
+    def remove(self, value: str) -> None:
+        self._formatted = None
+        super().remove(value)
+
+    def pop(self) -> str:
+        self._formatted = None
+        return super().pop()
+
+    def clear(self) -> None:
+        self._formatted = None
+        super().clear()
+
+    def update(self, *others: Iterable[str]) -> None:
+        self._formatted = None
+        super().update(*others)
+
+    def difference_update(self, *others: Iterable[Any]) -> None:
+        self._formatted = None
+        super().difference_update(*others)
+
+    def intersection_update(self, *others: Iterable[Any]) -> None:
+        self._formatted = None
+        super().intersection_update(*others)
+
+    def symmetric_difference_update(self, other: Iterable[str]) -> None:
+        self._formatted = None
+        super().symmetric_difference_update(other)
+
+    def __ior__(  # type: ignore[override,misc]
+        self, other: AbstractSet[str],
+    ) -> "_ClassSet":
+        self._formatted = None
+        return super().__ior__(other)
+
+    def __iand__(self, other: AbstractSet[object]) -> "_ClassSet":
+        self._formatted = None
+        return super().__iand__(other)
+
+    def __isub__(self, other: AbstractSet[object]) -> "_ClassSet":
+        self._formatted = None
+        return super().__isub__(other)
+
+    def __ixor__(  # type: ignore[override,misc]
+        self, other: AbstractSet[str],
+    ) -> "_ClassSet":
+        self._formatted = None
+        return super().__ixor__(other)
+
+    def format(self) -> str:
+        if self._formatted is not None:
+            return self._formatted
+
+        if not self:
+            result = ""
+        elif len(self) == 1:
+            # a single class does not need sorting
+            (item,) = self
+            result = f" class=\"{escape(item)}\""
+        else:
+            classes = " ".join(map(escape, sorted(self)))
+            result = f" class=\"{classes}\""
+
+        self._formatted = result
+        return result
+
+
+class _AttributeMap(Dict[str, AttributeValue]):
+    """ Tag attributes mapping which caches its formatted representation """
+
+    __slots__ = ("_formatted",)
+
+    def __init__(self, *args: Any, **kwargs: AttributeValue):
+        super().__init__(*args, **kwargs)
+        self._formatted: Optional[str] = None
+
+    @classmethod
+    def _from_kwargs(
+        cls, attributes: Mapping[str, Any],
+        defaults: Optional[Mapping[str, AttributeValue]] = None,
+    ) -> "_AttributeMap":
+        """ Normalizes keyword arguments like ``data_id=1`` to attributes,
+        ``defaults`` must be normalized already. """
+        items = {
+            sys.intern(key.replace("_", "-")): str(value)
+            for key, value in attributes.items()
+        }
+        if defaults:
+            return cls({**defaults, **items})
+        return cls(items)
+
+    def __copy__(self) -> "_AttributeMap":
+        return self.__class__(self)
+
+    # every mutating dict method has to drop the cached string
+
+    def __setitem__(self, key: str, value: AttributeValue) -> None:
+        self._formatted = None
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self._formatted = None
+        super().__delitem__(key)
+
+    if sys.version_info >= (3, 9):
+        def __ior__(self, other: Any) -> "_AttributeMap":  # type: ignore[override,misc]
+            self._formatted = None
+            return super().__ior__(other)
+
+    def clear(self) -> None:
+        self._formatted = None
+        super().clear()
+
+    def pop(self, *args: Any) -> Any:
+        self._formatted = None
+        return super().pop(*args)
+
+    def popitem(self) -> Tuple[str, AttributeValue]:
+        self._formatted = None
+        return super().popitem()
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        self._formatted = None
+        return super().setdefault(key, default)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self._formatted = None
+        super().update(*args, **kwargs)
+
+    def format(self) -> str:
+        if self._formatted is not None:
+            return self._formatted
+
+        parts = []
+        # Style values are mutable, so the result can not be cached
+        cacheable = True
+        for key, value in self.items():
+            key = escape(key)
+            if value is None:
+                parts.append(f" {key}")
+                continue
+            if not isinstance(value, str):
+                cacheable = False
+            value = escape(str(value), quote=True)
+            parts.append(f" {key}=\"{value}\"")
+
+        result = "".join(parts)
+        if cacheable:
+            self._formatted = result
+        return result
+
+
+TagType = TypeVar("TagType", bound="Tag")
+
+
 class Tag:
+    __slots__ = ("name", "_classes", "children", "_attributes")
+
     name: str
-    classes: MutableSet[str]
+    _classes: _ClassSet
     children: List[Union["Tag", str]]
-    attributes: MutableMapping[str, Union[str, None, Style]]
+    _attributes: _AttributeMap
 
     def __init__(
         self,
         _tag_name: str,
         *_children: Union[str, "Tag"],
         classes: Iterable[str] = (),
-        **attributes: Union[str, None, Style]
+        **attributes: AttributeValue
     ):
-        attrs: MutableMapping[str, Union[str, None, Style]] = {}
-        for key, value in attributes.items():
-            attrs[key.replace("_", "-")] = escape(str(value))
-
-        self.name = escape(_tag_name)
-        self.classes = set(classes)
-        self.attributes = attrs
+        self.name = sys.intern(escape(_tag_name))
+        self._classes = _ClassSet(classes)
+        self._attributes = _AttributeMap._from_kwargs(attributes)
         self.children = list(_children)
 
+    @classmethod
+    def _new(
+        cls: Type[TagType], name: str, children: List[Union["Tag", str]],
+        classes: _ClassSet, attributes: _AttributeMap,
+    ) -> TagType:
+        """ Creates a tag from already normalized parts, bypassing __init__ """
+        self = cls.__new__(cls)
+        self.name = name
+        self.children = children
+        self._classes = classes
+        self._attributes = attributes
+        return self
+
+    @property
+    def classes(self) -> Set[str]:
+        return self._classes
+
+    @classes.setter
+    def classes(self, value: Iterable[str]) -> None:
+        self._classes = _ClassSet(value)
+
+    @property
+    def attributes(self) -> Dict[str, AttributeValue]:
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, value: Mapping[str, AttributeValue]) -> None:
+        self._attributes = _AttributeMap(value)
+
     def append(self, other: Union["Tag", str]) -> None:
         return self.children.append(other)
 
-    def __setitem__(self, key: str, value: Optional[str]) -> None:
-        self.attributes[escape(key)] = escape(value) if value is not None else None
-
-    def __getitem__(self, item: str) -> Union[str, None, Style]:
-        return self.attributes[escape(item)]
+    def extend(self, children: Iterable[Union["Tag", str]]) -> None:
+        return self.children.extend(children)
 
-    def _format_attributes(self) -> str:
-        parts = []
-        for key, value in self.attributes.items():
-            key = escape(key)
-            if value is None:
-                parts.append(key)
-                continue
-            value = escape(str(value), quote=True)
-            parts.append(f"{key}=\"{value}\"")
-        return " ".join(parts)
-
-    def _format_classes(self) -> str:
-        if not self.classes:
-            return ""
-        return f"class=\"{' '.join(map(escape, sorted(self.classes)))}\""
+    def __setitem__(self, key: str, value: Optional[str]) -> None:
+        self._attributes[sys.intern(key)] = value
 
-    def __make_parts(self) -> Iterator[str]:
-        yield self.name
-        classes = self._format_classes()
+    def __getitem__(self, item: str) -> AttributeValue:
+        return self._attributes[item]
 
-        if classes:
-            yield classes
+    def __delitem__(self, item: str) -> None:
+        del self._attributes[item]
 
-        attributes = self._format_attributes()
-        if attributes:
-            yield attributes
+    def _format_tag_open(self) -> str:
+        if not self._classes and not self._attributes:
+            # most tags have neither classes nor attributes
+            return "<" + self.name
+        # both parts are cached by their containers until mutated
+        return f"<{self.name}{self._classes.format()}{self._attributes.format()}"
 
     def __repr__(self) -> str:
         if self.children:
-            return f"<{' '.join(self.__make_parts())}>...</{self.name}>"
+            return f"{self._format_tag_open()}>...</{self.name}>"
         else:
-            return f"<{' '.join(self.__make_parts())}/>"
+            return f"{self._format_tag_open()}/>"
 
     def __str__(self) -> str:
         return self.to_string()
 
-    def _to_string(self) -> List[str]:
-        parts = [f"<{' '.join(self.__make_parts())}"]
-        if self.children:
-            parts.append(">")
-            for child in self.children:
-                if isinstance(child, Tag):
-                    parts.extend(child._to_string())
-                else:
-                    parts.append(child)
-            parts.append(f"</{self.name}>")
-        else:
-            parts.append(f"/>")
-        return parts
-
-    def _to_pretty_string(self, _indent: str = "") -> List[str]:
-        parts = [f"<{' '.join(self.__make_parts())}"]
-        if self.children:
-            parts.append(">\n")
-            for child in self.children:
-                if isinstance(child, Tag):
-                    parts.extend(child._to_pretty_string("\t"))
-                else:
-                    child_str = child.strip()
-                    if not child_str:
-                        continue
-                    parts.append(indent(child_str, _indent if _indent else "\t"))
-                    parts.append(f"\n")
-            parts.append(f"</{self.name}>\n")
-        else:
-            parts.append(f"/>\n")
-        return [indent("".join(parts), _indent)]
+    def _iter_fragments(self, indent_str: str = "") -> Iterator[str]:
+        # Walks the tree with an explicit stack in one flat generator
+        # instead of recursion, so deep trees do not hit the interpreter
+        # recursion limit and no per-node generators or lists are created.
+        newline = "\n" if indent_str else ""
+        open_end = ">" + newline
+        void_end = "/>" + newline
+
+        # entries are (child, prefix), or (closing tag, None) for an already
+        # rendered closing tag, which can not be mistaken for a child
+        stack: List[Tuple[Union["Tag", str], Optional[str]]] = [(self, "")]
+        push = stack.append
+        pop = stack.pop
+
+        while stack:
+            node, prefix = pop()
+            if prefix is None:
+                # closing tags are always pushed as str
+                yield node  # type: ignore[misc]
+            elif isinstance(node, Tag):
+                if prefix:
+                    yield prefix
+                yield node._format_tag_open()
+                children = node.children
+                if not children:
+                    yield void_end
+                    continue
+                if (
+                    not indent_str and len(children) == 1 and
+                    type(children[0]) is str
+                ):
+                    # text-only leaf, the most common element in a document
+                    yield f">{children[0]}</{node.name}>"
+                    continue
+                yield open_end
+                push((f"{prefix}</{node.name}>{newline}", None))
+                child_prefix = prefix + indent_str
+                for child in reversed(children):
+                    push((child, child_prefix))
+            elif indent_str:
+                text = node.strip()
+                if not text:
+                    continue
+                yield indent(text, prefix) if "\n" in text else prefix + text
+                yield "\n"
+            else:
+                yield node
 
     def to_string(self, pretty: bool = False) -> str:
-        return "".join(self._to_pretty_string() if pretty else self._to_string())
+        return "".join(self._iter_fragments("\t" if pretty else ""))
+
+    def iter_string(
+        self, pretty: bool = False, chunk_size: int = 65536, prefix: str = "",
+    ) -> Iterator[str]:
+        """
+        Renders the tag lazily, without building the whole string in memory.
+        Every yielded chunk except the last one is at least ``chunk_size``
+        characters long. ``prefix`` is written before the tag, as part of
+        the first chunk.
+        """
+        buf: List[str] = [prefix] if prefix else []
+        size = len(prefix)
+        for fragment in self._iter_fragments("\t" if pretty else ""):
+            buf.append(fragment)
+            size += len(fragment)
+            if size >= chunk_size:
+                yield "".join(buf)
+                buf.clear()
+                size = 0
+        if buf:
+            yield "".join(buf)
 
 
 class TagInstance(Tag):
+    __slots__ = ()
+
     __tag_name__: str
-    __default_children__: Iterable[Union[str, Tag]] = ()
-    __default_attributes__: Optional[Mapping[str, str]] = None
+    __default_children__: Tuple[Union[str, Tag], ...] = ()
+    __default_attributes__: Optional[Mapping[str, AttributeValue]] = None
+
+    def __init_subclass__(cls, **kwargs: Any):
+        # normalize class level declarations once, for classes made by
+        # create_tag_class and for user subclasses alike, so __init__
+        # can use them as is
+        super().__init_subclass__(**kwargs)
+        if "__tag_name__" in cls.__dict__:
+            cls.__tag_name__ = sys.intern(escape(cls.__tag_name__))
+        if "__default_children__" in cls.__dict__:
+            cls.__default_children__ = tuple(cls.__default_children__)
+        default_attributes = cls.__dict__.get("__default_attributes__")
+        if default_attributes:
+            cls.__default_attributes__ = MappingProxyType(dict(
+                _AttributeMap._from_kwargs(dict(default_attributes)),
+            ))
 
     def __init__(
         self,
         *_children: Union[str, "Tag"],
         classes: Iterable[str] = (),
-        **attributes: Union[str, None, Style]
+        **attributes: AttributeValue
     ):
-        attrs: Dict[str, Union[str, None, Style]] = (
-            dict(self.__default_attributes__ or {})
-        )
-        attrs.update(**attributes)
-        _children = tuple(
-            copy(item) for item in chain(self.__default_children__, _children)
+        # __tag_name__ is escaped and interned by __init_subclass__
+        self.name = self.__tag_name__
+        self._classes = _ClassSet(classes)
+        self._attributes = _AttributeMap._from_kwargs(
+            attributes, self.__default_attributes__,
         )
+        self.children = list(_children)
 
-        super().__init__(
-            self.__tag_name__,
-            *_children,
-            classes=classes,
-            **attrs
-        )
+        if self.__default_children__:
+            # defaults are shared by every instance, so they are copied,
+            # the caller's children are kept as is and may be changed later
+            self.children[:0] = [
+                item if isinstance(item, str) else copy(item)
+                for item in self.__default_children__
+            ]
 
     def __copy__(self) -> "TagInstance":
-        children = tuple(copy(item) for item in self.children)
-        return self.__class__(
-            *children,
-            classes=copy(self.classes),
-            **self.attributes
+        # the source tag is already normalized, so skip __init__
+        return self._new(
+            self.name,
+            [
+                item if isinstance(item, str) else copy(item)
+                for item in self.children
+            ],
+            copy(self._classes),
+            copy(self._attributes),
         )
 
 
 @lru_cache(None)
 def create_tag_class(tag_name: str, **defaults: Any) -> Type[TagInstance]:
-    class_attrs = {"__tag_name__": tag_name}
+    class_attrs: Dict[str, Any] = {
+        "__tag_name__": tag_name,
+        "__slots__": (),
+    }
     if defaults:
         class_attrs.update(defaults)
     return type(    # type: ignore
@@ -180,16 +508,38 @@ def create_tag_class(tag_name: str, **defaults: Any) -> Type[TagInstance]:
     )
 
 
+def _make_hashable(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return tuple(value.items())
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
 class HTML:
     def __init__(self, defaults: Mapping[str, Mapping[str, Any]]):
-        self.__defaults: Mapping[str, Mapping[str, Any]] = MappingProxyType(defaults)
+        # create_tag_class is lru_cached, so its arguments must be hashable
+        self.__defaults: Mapping[str, Mapping[str, Any]] = MappingProxyType({
+            tag_name: {
+                key: _make_hashable(value)
+                for key, value in tag_defaults.items()
+            }
+            for tag_name, tag_defaults in defaults.items()
+        })
 
     def __getitem__(self, tag_name: str) -> Type[TagInstance]:
         tag_name = tag_name.lower().replace("_", "-")
         return create_tag_class(tag_name, **self.__defaults.get(tag_name, {}))
 
     def __getattr__(self, tag_name: str) -> Type[TagInstance]:
-        return self[tag_name.replace("_", "-")]
+        if tag_name.startswith("__"):
+            # do not turn special method lookups (copy, pickle) into tags
+            raise AttributeError(tag_name)
+        tag_class = self[tag_name.replace("_", "-")]
+        # store it on the instance, so the next lookup of the same name
+        # is a regular attribute access and never reaches __getattr__
+        setattr(self, tag_name, tag_class)
+        return tag_class
 
 
 html = HTML({
@@ -213,6 +563,13 @@ class Page:
     def to_html5(self, pretty: bool = False) -> str:
         return "".join((self.PREAMBLE, self.html.to_string(pretty=pretty)))
 
+    def iter_html5(
+        self, pretty: bool = False, chunk_size: int = 65536,
+    ) -> Iterator[str]:
+        return self.html.iter_string(
+            pretty=pretty, chunk_size=chunk_size, prefix=self.PREAMBLE,
+        )
+
 
 __all__ = (
     "HTML",
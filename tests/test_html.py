@@ -1,8 +1,9 @@
+import json
 from copy import copy
 
 import pytest
 
-from tagz import HTML, Page, Style, StyleSheet, Tag, html
+from tagz import HTML, Page, Style, StyleSheet, Tag, TagInstance, html
 
 
 @pytest.fixture
@@ -72,6 +73,16 @@ def test_tag_features():
 
     assert div["id"] == "foo"
     div["custom_attr"] = " custom value "
+    assert div["custom_attr"] == " custom value "
+
+    # item access stores keys exactly as given
+    div = html.div()
+    div["_"] = "on click"
+    assert str(div) == '<div _="on click"/>'
+
+    div = html.div("a")
+    div.extend(html.i(c) for c in "bc")
+    assert str(div) == "<div>a<i>b</i><i>c</i></div>"
 
     div = html.div()
     div["custom"] = None
@@ -106,6 +117,26 @@ def test_style():
     )
 
 
+def test_style_mutation():
+    style = Style(color="red")
+    assert str(style) == "color: red;"
+
+    style.update(margin=0)
+    assert str(style) == "color: red; margin: 0;"
+
+    style.pop("margin")
+    style.setdefault("padding", 1)
+    assert str(style) == "color: red; padding: 1;"
+
+    del style["color"]
+    assert str(style) == "padding: 1;"
+
+    style.clear()
+    assert str(style) == ""
+
+    assert str(copy(Style(color="red"))) == "color: red;"
+
+
 def test_stylesheet():
     style_sheet = StyleSheet()
     style_sheet["body"] = Style(background_color="#000000", color="#ffffff")
@@ -127,3 +158,170 @@ def test_tag_copy():
     assert tag["name"] == "foo"
     assert clone["name"] == "bar"
 
+
+def test_deep_nesting():
+    tag = leaf = html.div()
+    for _ in range(5000):
+        leaf.append(html.div())
+        leaf = leaf.children[0]
+
+    result = str(tag)
+    assert result.startswith("<div><div><div>")
+    assert result.endswith("</div></div></div>")
+    assert result.count("<div/>") == 1
+
+    pretty = tag.to_string(pretty=True)
+    assert pretty.splitlines()[3] == "\t\t\t<div>"
+
+    # None is not a valid child and must not be taken for a closing tag
+    with pytest.raises(TypeError):
+        str(html.div(None))
+
+
+def test_mutation_after_render():
+    tag = html.div(classes=["foo"], id="main")
+    assert str(tag) == '<div class="foo" id="main"/>'
+
+    tag.classes.add("bar")
+    assert str(tag) == '<div class="bar foo" id="main"/>'
+
+    tag.classes.discard("foo")
+    tag["title"] = "hello"
+    assert str(tag) == '<div class="bar" id="main" title="hello"/>'
+
+    del tag["id"]
+    tag.attributes.pop("title")
+    assert str(tag) == '<div class="bar"/>'
+
+    tag.classes = ["baz"]
+    tag.attributes = {"lang": "en"}
+    assert str(tag) == '<div class="baz" lang="en"/>'
+
+    # classes and attributes are a real set and dict
+    assert isinstance(tag.classes, set)
+    assert isinstance(tag.attributes, dict)
+    assert repr(tag.classes) == "{'baz'}"
+    assert json.dumps(tag.attributes) == '{"lang": "en"}'
+    assert type(tag.classes.copy()) is set
+    assert type(tag.attributes.copy()) is dict
+
+    tag.classes.update(["qux"], {"a"})
+    tag.classes |= {"b"}
+    tag.classes -= {"qux"}
+    assert tag.classes.union({"c"}) == {"a", "b", "baz", "c"}
+    assert str(tag) == '<div class="a b baz" lang="en"/>'
+
+    tag.classes.intersection_update({"a", "b"})
+    tag.classes.symmetric_difference_update({"b", "c"})
+    assert str(tag) == '<div class="a c" lang="en"/>'
+
+    tag.attributes.update(id="main")
+    tag.attributes.setdefault("title", "t")
+    assert str(tag) == '<div class="a c" lang="en" id="main" title="t"/>'
+    tag.attributes.clear()
+    tag.classes.clear()
+    assert str(tag) == "<div/>"
+
+
+def test_attribute_escaping():
+    tag = html.a("link", href="/?a=1&b=2", title='"quoted"')
+    assert tag["href"] == "/?a=1&b=2"
+    assert str(tag) == (
+        '<a href="/?a=1&amp;b=2" title="&quot;quoted&quot;">link</a>'
+    )
+
+    tag["data-x"] = "<x>"
+    assert tag["data-x"] == "<x>"
+    assert str(tag).startswith(
+        '<a href="/?a=1&amp;b=2" title="&quot;quoted&quot;" data-x="&lt;x&gt;">',
+    )
+    assert str(copy(tag)) == str(tag)
+
+
+def test_tag_copy_keeps_structure():
+    tag = html.div(html.p("text"), classes=["x"], data_a="1")
+    clone = copy(tag)
+    assert str(clone) == str(tag)
+    assert clone.children[0] is not tag.children[0]
+
+    clone.classes.add("y")
+    clone["data-a"] = "2"
+    assert str(tag) == '<div class="x" data-a="1"><p>text</p></div>'
+    assert str(clone) == '<div class="x y" data-a="2"><p>text</p></div>'
+
+    # default children must not be added a second time
+    assert str(copy(html.script(src="/app.js"))) == (
+        '<script src="/app.js"></script>'
+    )
+
+
+def test_children_are_not_copied():
+    content = html.div(id="content")
+    page = Page(body_element=html.body(html.h1("Example page"), content))
+    content.append("Example page content")
+
+    assert page.body.children[1] is content
+    assert (
+        '<div id="content">Example page content</div>' in page.to_html5()
+    )
+
+
+def test_html_default_attributes():
+    html_class = HTML({
+        "nav-bar": {"__default_attributes__": {"data_role": "navigation"}},
+    })
+    assert str(html_class.nav_bar()) == '<nav-bar data-role="navigation"/>'
+    assert str(html_class.nav_bar(data_role="menu", id="top")) == (
+        '<nav-bar data-role="menu" id="top"/>'
+    )
+
+
+def test_iter_string(sample_html_page):
+    tag = html.div(*[html.p(f"Paragraph {i}", id=str(i)) for i in range(100)])
+
+    assert "".join(tag.iter_string()) == str(tag)
+    assert "".join(tag.iter_string(pretty=True)) == tag.to_string(pretty=True)
+
+    chunks = list(tag.iter_string(chunk_size=128))
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 128 for chunk in chunks[:-1])
+    assert "".join(chunks) == str(tag)
+
+    assert list(html.br().iter_string()) == ["<br/>"]
+
+    assert "".join(sample_html_page.iter_html5(chunk_size=16)) == (
+        sample_html_page.to_html5()
+    )
+    assert "".join(sample_html_page.iter_html5(pretty=True)) == (
+        sample_html_page.to_html5(pretty=True)
+    )
+
+    # the preamble is a part of the first chunk, not a short chunk of its own
+    page = Page(body_element=html.body(tag))
+    chunks = list(page.iter_html5(chunk_size=100))
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 100 for chunk in chunks[:-1])
+    assert "".join(chunks) == page.to_html5()
+    assert list(sample_html_page.iter_html5()) == [sample_html_page.to_html5()]
+
+
+def test_tag_instance_subclass():
+    class Odd(TagInstance):
+        __tag_name__ = "x<y"
+
+    assert str(Odd()) == "<x&lt;y/>"
+
+
+def test_tag_class_subclass():
+    class Card(html.div):
+        __default_attributes__ = {"data_role": "card", "tabindex": 0}
+
+    card = Card(id="x")
+    assert str(card) == '<div data-role="card" tabindex="0" id="x"/>'
+    assert card["tabindex"] == "0"
+    assert str(copy(card)) == str(card)
+
+
+def test_page_preamble_override(sample_html_page):
+    sample_html_page.PREAMBLE = "<!DOCTYPE html>\n"
+    assert sample_html_page.to_html5().startswith("<!DOCTYPE html>\n<html")